@@ -1,130 +1,586 @@
+import functools
+import inspect
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, time as dtime, timedelta
-from typing import Optional
+from typing import Any, Callable, Optional
 
+import httpx
 import streamlit as st
+import numpy as np
 import pandas as pd
-from supabase import create_client, Client
-from streamlit_autorefresh import st_autorefresh
+import pyarrow as pa
+import pyarrow.compute as pc
+from supabase import create_client, Client, ClientOptions
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import altair as alt
 
 
 # ============================================================
-# Auto-refresh every 60 seconds
+# Supabase Client
 # ============================================================
-st_autorefresh(interval=60_000, key="refresh")
 
+# Concurrent queries are bounded by the fetch executor; the HTTP pool keeps
+# that many connections alive, with headroom for main-thread queries.
+FETCH_WORKERS = 4
+HTTP_LIMITS = httpx.Limits(
+    max_connections=FETCH_WORKERS * 2,
+    max_keepalive_connections=FETCH_WORKERS * 2,
+    keepalive_expiry=120.0,
+)
 
-# ============================================================
-# Supabase Client
-# ============================================================
 
 @st.cache_resource
 def get_supabase_client() -> Optional[Client]:
     try:
         url = st.secrets["SUPABASE_URL"]
         key = st.secrets["SUPABASE_KEY"]
-        return create_client(url, key)
-    except Exception:
+    except (KeyError, FileNotFoundError):
         st.error("❌ Missing Supabase credentials.")
         st.stop()
 
+    # One pooled HTTP/2 client shared by every session and rerun. Built
+    # outside the secrets check so transport errors surface as themselves.
+    http = httpx.Client(
+        limits=HTTP_LIMITS, timeout=10.0, http2=True, follow_redirects=True
+    )
+    return create_client(url, key, options=ClientOptions(httpx_client=http))
+
 
 sb = get_supabase_client()
 
 
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
+
+
+# ============================================================
+# Query schemas (only what the dashboard reads)
+# ============================================================
+
+TRADES_SCHEMA = pa.schema([
+    ("ts", pa.timestamp("us", tz="UTC")),
+    ("symbol", pa.string()),
+    ("side", pa.string()),
+    ("qty", pa.float64()),
+    ("fill_price", pa.float64()),
+    ("pnl", pa.float64()),
+    ("realized_pnl", pa.float64()),
+    ("win", pa.bool_()),
+    ("is_entry", pa.bool_()),
+    ("is_exit", pa.bool_()),
+    ("exit_reason", pa.string()),
+])
+
+SHADOW_SCHEMA = pa.schema([
+    ("ts", pa.timestamp("us", tz="UTC")),
+    ("symbol", pa.string()),
+    ("ml_direction", pa.string()),
+    ("ml_win_prob", pa.float64()),
+    ("bot_action", pa.string()),
+])
+
+# Daily metrics and the equity curve read only these trade columns; the
+# full row is only needed by the latest-exits table. P&L stays float64:
+# float32 can't hold cents once values reach the hundreds of thousands.
+PNL_TRADES_SCHEMA = pa.schema([
+    TRADES_SCHEMA.field(c) for c in ("ts", "symbol", "realized_pnl", "win", "is_exit")
+])
+
+# The latest-exits table shows every trade column except the is_entry/is_exit
+# flags, which are constant there
+EXIT_TABLE_SCHEMA = pa.schema([
+    f for f in TRADES_SCHEMA if f.name not in ("is_entry", "is_exit")
+])
+
+# PostgREST select lists, built once from the schemas
+EXIT_TABLE_COLS = ",".join(EXIT_TABLE_SCHEMA.names)
+PNL_TRADE_COLS = ",".join(PNL_TRADES_SCHEMA.names)
+SHADOW_COLS = ",".join(SHADOW_SCHEMA.names)
+
+# P&L column used for metrics and charts
+PNL_COL = "realized_pnl"
+
+# Base equity for the curve (can be set via env)
+BASE_EQUITY = float(os.getenv("DASHBOARD_BASE_EQUITY", "100000"))
+
+# Low-cardinality string columns, loaded as pandas categoricals
+CATEGORY_COLS = ("symbol", "side", "exit_reason", "ml_direction", "bot_action")
+
+
 # ============================================================
 # Helpers
 # ============================================================
 
-def normalize_ts(df: pd.DataFrame):
-    if "ts" in df.columns:
-        df["ts"] = pd.to_datetime(df["ts"], errors="coerce")
-    return df
+TRUE_STRINGS = {"true", "1", "t", "yes", "y"}
 
 
-def normalize_exit_flag(val):
-    if val is True:
-        return True
-    if val in [False, None]:
-        return False
-    return str(val).strip().lower() in ("true", "1", "t", "yes", "y")
+def to_bool(s: pd.Series) -> pd.Series:
+    """
+    Interpret a flag column as booleans. Dispatches on dtype so bool and
+    numeric columns skip string parsing; only object columns are parsed.
+    """
+    if pd.api.types.is_bool_dtype(s):
+        return s.fillna(False).astype(bool)
+    if pd.api.types.is_numeric_dtype(s):
+        return s.fillna(0) != 0
+    return s.astype(str).str.strip().str.lower().isin(TRUE_STRINGS)
+
+
+def decode_leniently(rows: list, schema: pa.Schema) -> pa.Table:
+    """
+    Slow path of rows_to_df() for rows the typed Arrow decode rejects, such
+    as a flag stored as "true" or 1 or a ts without a zone offset. Flags are
+    read with to_bool(), naive timestamps are taken as UTC, and values that
+    still don't parse become null instead of failing the whole fetch.
+    """
+    df = pd.DataFrame.from_records(rows, columns=schema.names)
+    for f in schema:
+        col = df[f.name]
+        if pa.types.is_timestamp(f.type):
+            df[f.name] = pd.to_datetime(col, utc=True, errors="coerce", format="ISO8601")
+        elif pa.types.is_boolean(f.type):
+            df[f.name] = to_bool(col)
+        elif pa.types.is_floating(f.type):
+            df[f.name] = pd.to_numeric(col, errors="coerce")
+        else:
+            df[f.name] = col.astype("string")
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False, safe=False)
+
+
+def rows_to_df(rows: list, schema: pa.Schema) -> pd.DataFrame:
+    """
+    Build a typed DataFrame from Supabase rows via an Arrow Table.
+    Columns and dtypes come from `schema`, so pandas does no per-cell dtype
+    inference and ISO timestamps are parsed by Arrow. CATEGORY_COLS become
+    categoricals and flag columns become plain bools (null -> False), so
+    they can be used directly as masks and summed. Rows with values the
+    typed path rejects fall back to decode_leniently().
+    """
+    wire = pa.schema([
+        pa.field(f.name, pa.string()) if pa.types.is_timestamp(f.type) else f
+        for f in schema
+    ])
+    try:
+        table = pa.Table.from_pylist(rows, schema=wire).cast(schema)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        table = decode_leniently(rows, schema)
+
+    for i, field in enumerate(schema):
+        if pa.types.is_boolean(field.type):
+            table = table.set_column(i, field, pc.fill_null(table.column(i), False))
+
+    return table.to_pandas(categories=[c for c in CATEGORY_COLS if c in schema.names])
+
+
+def filter_symbol(df: pd.DataFrame, symbol: Optional[str]) -> pd.DataFrame:
+    """
+    Narrow a day frame to one symbol. The day fetchers are keyed on dates
+    only, so switching symbols reuses the cached frame instead of re-querying.
+    """
+    if symbol is None or df.empty:
+        return df
+    return df[df["symbol"] == symbol]
+
+
+POS_PNL_STYLE = "background-color: rgba(0,255,0,0.25);"
+NEG_PNL_STYLE = "background-color: rgba(255,0,0,0.25);"
+
+
+def pnl_styler(col: pd.Series) -> np.ndarray:
+    """
+    Styler.apply() callback coloring a P&L column green/red, computed in one
+    vectorized pass over the column instead of a Python call per cell.
+    """
+    v = col.to_numpy(dtype=float, na_value=np.nan)
+    return np.where(v > 0, POS_PNL_STYLE, np.where(v < 0, NEG_PNL_STYLE, ""))
+
+
+def exit_metrics(df: pd.DataFrame) -> dict:
+    """
+    Per-symbol exit count, P&L and wins for an exits frame, in one groupby
+    pass. Keyed by symbol so the summary for any symbol filter is a lookup.
+    """
+    agg = df.groupby("symbol", sort=False, observed=True, dropna=False).agg(
+        n_exits=("win", "size"),
+        total_pnl=(PNL_COL, "sum"),
+        wins=("win", "sum"),
+    )
+    return agg.to_dict("index")
+
+
+def day_metrics(df: pd.DataFrame, symbol: Optional[str]) -> dict:
+    """
+    Per-symbol exit metrics of a day's exits, narrowed to `symbol` (None = all).
+    Uses the metrics cached in df.attrs by fetch_exits() when present.
+    """
+    metrics = df.attrs.get("metrics") or exit_metrics(df)
+    if symbol is None:
+        return metrics
+    return {symbol: metrics[symbol]} if symbol in metrics else {}
+
+
+def summarize_day(df: pd.DataFrame, symbol: Optional[str]) -> tuple:
+    """(exits, total P&L, wins, win rate %) for a day's exits and symbol filter."""
+    picked = day_metrics(df, symbol).values()
+    total_exits = int(sum(m["n_exits"] for m in picked))
+    total_pnl = sum(m["total_pnl"] for m in picked)
+    wins = int(sum(m["wins"] for m in picked))
+    return total_exits, total_pnl, wins, wins / total_exits * 100
+
+
+def merge_metrics(a: dict, b: dict, sign: int = 1) -> dict:
+    """
+    Add (or with sign=-1, subtract) two exit_metrics() results, used when
+    rows are appended to or dropped from a frame. Symbols left with no
+    exits are removed.
+    """
+    merged = {sym: dict(m) for sym, m in a.items()}
+    for sym, m in b.items():
+        acc = merged.setdefault(sym, dict.fromkeys(m, 0))
+        for k, v in m.items():
+            acc[k] += sign * v
+    return {sym: m for sym, m in merged.items() if m["n_exits"]}
+
+
+def frame_fingerprint(df: pd.DataFrame) -> tuple:
+    """
+    Cheap content fingerprint of a ts-ascending frame: row count and last ts.
+    Fetched frames only change by gaining newer rows, so this is enough to
+    tell whether a rerun sees new data.
+    """
+    return (len(df), df["ts"].iloc[-1] if len(df) else None)
+
+
+def reuse_if_unchanged(key: str, fingerprint, build: Callable[[], Any]):
+    """
+    Return build(), reusing the value kept in session_state under `key`
+    while `fingerprint` is unchanged since the last rerun. The 60s fragment
+    refresh usually sees identical rows, so charts are rebuilt only on change.
+    """
+    held = st.session_state.get(key)
+    if held is not None and held[0] == fingerprint:
+        return held[1]
+    value = build()
+    st.session_state[key] = (fingerprint, value)
+    return value
+
+
+def report_errors(message: str, default: Callable[[], Any]):
+    """
+    Wrap a cached fetcher so a failure is shown with st.error and `default()`
+    is returned. The exception escapes the cache, so a failed query is retried
+    on the next rerun instead of being cached (and its error replayed) for the
+    whole TTL. Callers that must tell a failure apart from an empty result
+    call `__wrapped__` directly and pass the exception to `report`.
+    """
+    def report(e: Exception):
+        st.error(f"❌ {message}: {e}")
+
+    def decorate(fetcher):
+        @functools.wraps(fetcher)
+        def wrapper(*args):
+            try:
+                return fetcher(*args)
+            except Exception as e:
+                report(e)
+                return default()
+
+        wrapper.clear = fetcher.clear
+        wrapper.report = report
+        return wrapper
+
+    return decorate
+
+
+def run_concurrently(*calls):
+    """
+    Run independent (fn, *args) calls on the shared executor and return their
+    results in order. Each worker is bound to the current script run so
+    cached functions and st.error behave as they would inline.
+    """
+    ctx = get_script_run_ctx()
+
+    def _run(fn, args):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+
+    futures = [get_executor().submit(_run, fn, args) for fn, *args in calls]
+    return [f.result() for f in futures]
 
 
 # ============================================================
 # Fetch functions
 # ============================================================
 
-@st.cache_data(ttl=10)
-def fetch_trades(symbol: Optional[str], day: Optional[date]):
+@functools.lru_cache(maxsize=64)
+def day_bounds(d: date) -> tuple:
+    """ISO strings for the first and last instant of a day (ISO dates are fixed-width)."""
+    s = d.isoformat()
+    return f"{s}T00:00:00", f"{s}T23:59:59.999999"
+
+
+# PostgREST caps each response at the project's max-rows setting (1000 by
+# default on Supabase); unbounded selects page through results this size.
+PAGE_ROWS = 1000
+# Primary key, ordered after ts so rows sharing a timestamp keep one order
+# across pages (an OFFSET page boundary could otherwise repeat or skip them)
+TIEBREAK_COL = "id"
+
+
+def select_rows(table: str,
+                cols: str,
+                start_day: Optional[date] = None,
+                end_day: Optional[date] = None,
+                since: Optional[pd.Timestamp] = None,
+                desc: bool = False,
+                limit: Optional[int] = None,
+                not_null: tuple = (),
+                **eq) -> list:
     """
-    Fetch trades for a single day (used for Daily metrics).
+    Run a (ts, id)-ordered select on `table`, shared by all fetchers.
+    Rows are bounded to [start_day, end_day] (whole days) when both are
+    given, to ts >= `since` when given, to column == value for each `eq`,
+    and to non-null values in each `not_null` column. Without a `limit`,
+    results are read in PAGE_ROWS pages so the server's row cap can't
+    silently truncate them.
     """
-    try:
-        q = sb.table("trades").select("*")
+    def query():
+        # Builders accumulate params, so every request starts from a new one
+        q = sb.table(table).select(cols)
 
-        if symbol:
-            q = q.eq("symbol", symbol)
+        for col, val in eq.items():
+            q = q.eq(col, val)
 
-        if day:
-            start = datetime.combine(day, dtime.min)
-            end = datetime.combine(day, dtime.max)
-            q = q.gte("ts", start.isoformat()).lte("ts", end.isoformat())
+        for col in not_null:
+            q = q.not_.is_(col, "null")
 
-        df = pd.DataFrame(q.order("ts", desc=False).execute().data or [])
-        return normalize_ts(df)
+        if start_day and end_day:
+            q = q.gte("ts", day_bounds(start_day)[0]).lte("ts", day_bounds(end_day)[1])
+
+        if since is not None:
+            q = q.gte("ts", since.isoformat())
+
+        return q.order("ts", desc=desc).order(TIEBREAK_COL, desc=desc)
 
-    except Exception as e:
-        st.error(f"❌ Error fetching trades: {e}")
-        return pd.DataFrame()
+    if limit is not None:
+        return query().range(0, limit - 1).execute().data or []
 
+    rows = []
+    while True:
+        page = query().range(len(rows), len(rows) + PAGE_ROWS - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < PAGE_ROWS:
+            return rows
 
-@st.cache_data(ttl=10)
-def fetch_trades_range(symbol: Optional[str],
-                       start_day: Optional[date],
-                       end_day: Optional[date]):
+
+@report_errors("Error fetching symbols", default=list)
+@st.cache_data(ttl=300, max_entries=32)
+def fetch_symbols_for_day(day: Optional[date]):
     """
-    Fetch trades over a date RANGE (used for equity curve).
-    If start_day/end_day are None, returns all trades (optionally filtered by symbol).
+    Fetch the distinct symbols traded on a day (used for the sidebar dropdown).
+    Only the symbol column is requested and no DataFrame is built.
     """
-    try:
-        q = sb.table("trades").select("*")
+    rows = select_rows("trades", "symbol", day, day)
+    return sorted({r["symbol"] for r in rows if r.get("symbol")})
 
-        if symbol:
-            q = q.eq("symbol", symbol)
 
-        if start_day and end_day:
-            start = datetime.combine(start_day, dtime.min)
-            end = datetime.combine(end_day, dtime.max)
-            q = q.gte("ts", start.isoformat()).lte("ts", end.isoformat())
+@report_errors("Error fetching exit trades", default=lambda: rows_to_df([], PNL_TRADES_SCHEMA))
+@st.cache_data(ttl=600, max_entries=32)
+def fetch_exits(day: Optional[date], since: Optional[pd.Timestamp] = None):
+    """
+    Fetch exit trades for a single day (used for Daily metrics).
+    The is_exit filter runs server-side so entry rows are never transferred.
+    All symbols are fetched; use filter_symbol() to narrow in-process.
+    If `since` is given, only rows with ts at or after it are returned.
+    """
+    rows = select_rows("trades", PNL_TRADE_COLS, day, day, since=since, is_exit=True)
+    df = rows_to_df(rows, PNL_TRADES_SCHEMA)
+    # Computed once per fetch and cached with the frame (attrs survive
+    # pickling and boolean indexing), so reruns don't re-aggregate.
+    df.attrs["metrics"] = exit_metrics(df)
+    return df
+
+
+@report_errors("Error fetching latest exits", default=lambda: rows_to_df([], EXIT_TABLE_SCHEMA))
+@st.cache_data(ttl=600, max_entries=32)
+def fetch_latest_exits(limit: int):
+    """
+    Fetch the most recent exit trades with a realized P&L, newest first.
+    Filtering, ordering and paging happen server-side; only `limit` rows
+    of the columns the table displays are returned.
+    """
+    rows = select_rows(
+        "trades", EXIT_TABLE_COLS, desc=True, limit=limit, not_null=(PNL_COL,), is_exit=True
+    )
+    return rows_to_df(rows, EXIT_TABLE_SCHEMA)
+
+
+@report_errors("Error fetching trades (range)", default=lambda: rows_to_df([], PNL_TRADES_SCHEMA))
+@st.cache_data(ttl=600, max_entries=32)
+def fetch_trades_range(start_day: Optional[date],
+                       end_day: Optional[date],
+                       symbol: Optional[str] = None):
+    """
+    Fetch exit trades over a date RANGE (used for equity curve).
+    If start_day/end_day are None, returns all exits. Unlike a single day,
+    a range can be large, so the is_exit and symbol filters run server-side.
+    """
+    eq = {"symbol": symbol} if symbol else {}
+    rows = select_rows("trades", PNL_TRADE_COLS, start_day, end_day, is_exit=True, **eq)
+    return rows_to_df(rows, PNL_TRADES_SCHEMA)
 
-        df = pd.DataFrame(q.order("ts", desc=False).execute().data or [])
-        return normalize_ts(df)
 
-    except Exception as e:
-        st.error(f"❌ Error fetching trades (range): {e}")
-        return pd.DataFrame()
+@report_errors("Error fetching shadow logs", default=lambda: rows_to_df([], SHADOW_SCHEMA))
+@st.cache_data(ttl=600, max_entries=32)
+def fetch_shadow(day: Optional[date], since: Optional[pd.Timestamp] = None):
+    rows = select_rows("ml_shadow_logs", SHADOW_COLS, day, day, since=since)
+    return rows_to_df(rows, SHADOW_SCHEMA)
 
 
-@st.cache_data(ttl=10)
-def fetch_shadow(symbol: Optional[str], day: Optional[date]):
+# ============================================================
+# Change detection
+# ============================================================
+
+@report_errors("Error checking for new rows", default=lambda: None)
+@st.cache_data(ttl=5, show_spinner=False)
+def fetch_latest_ts(table: str) -> Optional[str]:
+    """
+    Cheap change probe: the newest ts in `table` (one row, one column).
+    """
+    rows = select_rows(table, "ts", desc=True, limit=1)
+    return rows[0]["ts"] if rows else None
+
+
+@st.cache_resource
+def get_seen_ts() -> dict:
+    # Shared across sessions, like the data caches it guards
+    return {}
+
+
+# The fetchers above keep results for 10 minutes; they are evicted as soon
+# as the newest ts of their table moves, so each rerun normally costs only
+# the two 1-row probes.
+WATCHED_FETCHERS = {
+    "trades": (fetch_symbols_for_day, fetch_exits, fetch_trades_range, fetch_latest_exits),
+    "ml_shadow_logs": (fetch_shadow,),
+}
+
+
+def evict_on_new_rows():
+    """
+    Probe each watched table and clear its fetchers if its newest ts moved.
+    Called only from the data fragment: the sidebar symbol list is evicted
+    here too, but it is re-read on the next full rerun (user interaction
+    or day rollover).
+    """
+    seen_ts = get_seen_ts()
+    latest_ts = run_concurrently(*[(fetch_latest_ts, table) for table in WATCHED_FETCHERS])
+
+    for (table, fetchers), ts in zip(WATCHED_FETCHERS.items(), latest_ts):
+        if ts is not None and seen_ts.get(table) != ts:
+            for fetcher in fetchers:
+                fetcher.clear()
+            seen_ts[table] = ts
+
+
+@st.cache_resource
+def get_live_frames() -> dict:
+    # fetcher name -> (day, frame) for the current UTC day only
+    return {}
+
+
+# How far back each top-up of a live frame re-reads, so rows sharing the
+# held max ts or committed late with a slightly older ts are still picked up
+LIVE_OVERLAP = timedelta(minutes=5)
+
+
+SETTLED_FETCHERS = {f.__name__: f for f in (fetch_exits, fetch_shadow, fetch_trades_range)}
+
+# Rows can be written or committed some time after their ts, so a day only
+# counts as settled (and is persisted to disk) this long after it ended
+SETTLE_GRACE = timedelta(hours=6)
+
+
+def is_settled(day: Optional[date]) -> bool:
+    """Whether `day` ended (UTC) more than SETTLE_GRACE ago."""
+    if day is None:
+        return False
+    day_end = datetime.combine(day + timedelta(days=1), dtime.min)
+    return datetime.utcnow() - day_end >= SETTLE_GRACE
+
+
+@st.cache_data(persist="disk", max_entries=64)
+def fetch_settled(fetcher_name: str, *args) -> pd.DataFrame:
+    """
+    Disk-persisted result of a fetcher whose dates are all settled (see
+    is_settled()), so restarts and redeploys don't re-download history.
+    Such results don't change, which matters because ttl is not supported
+    with persist. Calls the undecorated query, so failures raise instead of
+    persisting an empty frame.
+    """
+    return inspect.unwrap(SETTLED_FETCHERS[fetcher_name])(*args)
+
+
+def fetch_past(fetcher, *args) -> pd.DataFrame:
+    """
+    Return fetcher(*args) for settled dates from the disk cache. On
+    failure, retry through the fetcher so the error is reported as usual.
+    """
     try:
-        q = sb.table("ml_shadow_logs").select("*")
+        return fetch_settled(fetcher.__name__, *args)
+    except Exception:
+        return fetcher(*args)
+
+
+def fetch_day_incremental(fetcher, day: Optional[date]) -> pd.DataFrame:
+    """
+    Return fetcher(day), growing today's frame incrementally: once held, only
+    the last LIVE_OVERLAP of rows is re-read, replacing the held rows in that
+    window. Settled days no longer change, so they are served from the
+    disk-persisted cache.
+    """
+    today = datetime.utcnow().date()
 
-        if symbol:
-            q = q.eq("symbol", symbol)
+    if is_settled(day):
+        return fetch_past(fetcher, day)
 
-        if day:
-            start = datetime.combine(day, dtime.min)
-            end = datetime.combine(day, dtime.max)
-            q = q.gte("ts", start.isoformat()).lte("ts", end.isoformat())
+    if day != today:
+        return fetcher(day)
 
-        df = pd.DataFrame(q.order("ts", desc=False).execute().data or [])
-        return normalize_ts(df)
+    live = get_live_frames()
+    held_day, prior = live.get(fetcher.__name__, (None, None))
+    latest = None if prior is None else prior["ts"].max()
 
-    except Exception as e:
-        st.error(f"❌ Error fetching shadow logs: {e}")
-        return pd.DataFrame()
+    if held_day != day or pd.isna(latest):
+        df = fetcher(day)
+    else:
+        since = latest - LIVE_OVERLAP
+        in_window = (prior["ts"] >= since).to_numpy()
+        held = prior[in_window]
+        try:
+            new = fetcher.__wrapped__(day, since)
+        except Exception as e:
+            # The default frame would read as "no rows" and drop the held
+            # window, so keep the held frame and retry on the next run
+            fetcher.report(e)
+            return prior
+        if frame_fingerprint(new) == frame_fingerprint(held):
+            df = prior
+        else:
+            df = pd.concat([prior[~in_window], new], ignore_index=True)
+            if "metrics" in prior.attrs:
+                kept = merge_metrics(prior.attrs["metrics"], exit_metrics(held), sign=-1)
+                df.attrs["metrics"] = merge_metrics(kept, new.attrs.get("metrics", {}))
+            # Re-derive categories, since the new rows may add values
+            for c in CATEGORY_COLS:
+                if c in df.columns:
+                    df[c] = df[c].astype("category")
+
+    live[fetcher.__name__] = (day, df)
+    return df
 
 
 # ============================================================
@@ -168,233 +624,353 @@ else:  # "All"
     range_start = None
     range_end = None
 
-df_for_symbols = fetch_trades(None, selected_date)
-symbols = sorted(df_for_symbols["symbol"].dropna().unique().tolist()) if "symbol" in df_for_symbols else []
+symbols = fetch_symbols_for_day(selected_date)
 
 symbol = st.sidebar.selectbox("Symbol", ["(All)"] + symbols)
 symbol = None if symbol == "(All)" else symbol
 
 if st.sidebar.button("🔄 Force Refresh"):
-    st.cache_data.clear()
-    st.experimental_rerun()
+    # Evict only what this view shows; other days stay warm
+    fetch_latest_ts.clear()
+    fetch_symbols_for_day.clear(selected_date)
+    fetch_exits.clear(selected_date)
+    fetch_shadow.clear(selected_date)
+    fetch_settled.clear("fetch_exits", selected_date)
+    fetch_settled.clear("fetch_shadow", selected_date)
+    fetch_settled.clear("fetch_trades_range", range_start, range_end, symbol)
+    get_live_frames().clear()
+    fetch_trades_range.clear(range_start, range_end, symbol)
+    fetch_latest_exits.clear()
+    st.rerun()
 
 
 # ============================================================
-# Load Data
+# Data panels (rerun on their own every 60 seconds)
 # ============================================================
 
-# Daily data (for the selected_date metrics)
-df_trades = fetch_trades(symbol, selected_date)
+EXITS_PAGE_SIZE = 10
+STYLED_ROWS_MAX = 200
+EQUITY_MAX_POINTS = 2000
 
-# Range data (for the equity curve)
-df_trades_range = fetch_trades_range(symbol, range_start, range_end)
 
-df_shadow = fetch_shadow(symbol, selected_date)
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of the points Largest-Triangle-Three-Buckets keeps when reducing
+    a line to `n_out` points. First and last points are always kept; each
+    bucket in between keeps the point forming the largest triangle with the
+    previously kept point and the next bucket's mean, so spikes survive.
+    """
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    keep = np.empty(n_out, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt = slice(hi, edges[i + 2] if i + 3 < n_out else n)
+        avg_x, avg_y = x[nxt].mean(), y[nxt].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
 
 
-# ============================================================
-# Daily Summary
-# ============================================================
+def build_equity_chart(exits_range: pd.DataFrame, range_start: Optional[date]):
+    """
+    Build the equity-curve chart from a range of exit trades, or return None
+    if the range is empty. The frame is read in place: both fetchers already
+    return exits only, so there is no mask to apply and nothing to copy.
+    """
+    if exits_range.empty:
+        return None
 
-st.subheader("📈 Daily Performance — Real Trades")
+    # Start-of-range anchor (horizontal line until first exit)
+    if range_start:
+        start_anchor = datetime.combine(range_start, dtime.min)
+    else:
+        first_ts = exits_range["ts"].iloc[0]
+        start_anchor = datetime.combine(first_ts.date(), dtime.min)
+
+    # Row 0 is the anchor; the arrays are allocated once with room for it
+    # instead of prepending a one-row frame with pd.concat.
+    n = len(exits_range)
+    ts = np.empty(n + 1, dtype="datetime64[us]")
+    ts[0] = np.datetime64(start_anchor, "us")
+    ts[1:] = exits_range["ts"].to_numpy(dtype="datetime64[us]")
+
+    # Rows arrive ts-ascending from the server; no client-side sort needed.
+    # NaN -> 0 and the running sum are done in place on the same array.
+    cum_pnl = np.empty(n + 1)
+    cum_pnl[0] = 0.0
+    cum_pnl[1:] = exits_range[PNL_COL].to_numpy()
+    np.nan_to_num(cum_pnl, copy=False)
+    np.cumsum(cum_pnl, out=cum_pnl)
+
+    # Long ranges are reduced to a fixed number of visual points, so the
+    # chart payload the browser receives stays bounded as trades accumulate
+    if len(ts) > EQUITY_MAX_POINTS:
+        keep = lttb_indices(ts.astype(np.int64).astype(float), cum_pnl, EQUITY_MAX_POINTS)
+        ts, cum_pnl = ts[keep], cum_pnl[keep]
+
+    curve = pd.DataFrame({
+        "ts": pd.DatetimeIndex(ts, tz="UTC"),
+        "cum_pnl": cum_pnl,
+        "equity": BASE_EQUITY + cum_pnl,
+    })
+
+    return (
+        alt.Chart(curve)
+        .mark_line()
+        .encode(
+            x=alt.X("ts:T", title="Time"),
+            y=alt.Y(
+                "equity:Q",
+                title="Portfolio Value",
+                scale=alt.Scale(zero=False),
+            ),
+            tooltip=[
+                alt.Tooltip("ts:T", title="Time"),
+                alt.Tooltip("equity:Q", title="Equity", format=",.2f"),
+                alt.Tooltip("cum_pnl:Q", title="Realized P&L", format=",.2f"),
+            ],
+        )
+        .properties(height=300)
+    )
 
-if df_trades.empty:
-    st.info("No trades for this date.")
-else:
-    df_trades["is_exit_norm"] = df_trades["is_exit"].apply(normalize_exit_flag)
-    exits = df_trades[df_trades["is_exit_norm"] == True].copy()
 
-    pnl_col = "realized_pnl" if "realized_pnl" in exits.columns else "pnl"
-    total_pnl = exits[pnl_col].fillna(0).sum()
+def build_pnl_chart(exits_day: pd.DataFrame, symbol: Optional[str]):
+    """
+    Build the P&L-by-symbol bar chart from the per-symbol metrics cached
+    with the day's exits.
+    """
+    by_sym = {
+        sym: m["total_pnl"]
+        for sym, m in day_metrics(exits_day, symbol).items()
+        if pd.notna(sym)
+    }
+    pnl_by_sym = pd.DataFrame({
+        "symbol": list(by_sym),
+        "total_pnl": list(by_sym.values()),
+    })
+
+    return (
+        alt.Chart(pnl_by_sym)
+        .mark_bar(size=50)
+        .encode(
+            x=alt.X("symbol:N", title="Symbol"),
+            y=alt.Y("total_pnl:Q", title="Total P&L", scale=alt.Scale(zero=False)),
+            color=alt.condition(
+                "datum.total_pnl > 0",
+                alt.value("#00cc66"),
+                alt.value("#cc0000"),
+            ),
+        )
+        .properties(height=300)
+    )
 
-    wins = exits["win"].fillna(False).sum() if "win" in exits.columns else 0
-    total_exits = len(exits)
-    win_rate = (wins / total_exits * 100) if total_exits else 0
 
-    c1, c2, c3, c4 = st.columns(4)
-    c1.metric("Exit Trades (Day)", total_exits)
-    c2.metric("Total P&L (Day)", f"{total_pnl:,.2f}")
-    c3.metric("Wins (Day)", int(wins))
-    c4.metric("Win Rate (Day)", f"{win_rate:.1f}%")
+def direction_counts(shadow: pd.DataFrame) -> pd.Series:
+    """Shadow log entries per ml_direction, with missing directions as UNKNOWN."""
+    # NaN gets its own bucket in the same pass; no filled copy of the column
+    counts = shadow["ml_direction"].value_counts(dropna=False)
+    counts.index = counts.index.astype(object).fillna("UNKNOWN")
+    return counts[counts > 0]
 
-# ============================================================
-# Portfolio Equity Curve over Range
-# ============================================================
 
-st.subheader("📊 Portfolio Value — Range View")
+def load_more_exits():
+    st.session_state["exits_limit"] += EXITS_PAGE_SIZE
 
-if df_trades_range.empty:
-    st.info("No trades in the selected range.")
-else:
-    df_trades_range["is_exit_norm"] = df_trades_range["is_exit"].apply(normalize_exit_flag)
-    exits_range = df_trades_range[df_trades_range["is_exit_norm"] == True].copy()
 
-    if exits_range.empty:
-        st.info("No exit trades in the selected range.")
+@st.fragment(run_every=60)
+def render_data_panels(page_day: date,
+                       selected_date: date,
+                       range_start: Optional[date],
+                       range_end: Optional[date],
+                       symbol: Optional[str]):
+    """
+    Everything that shows fetched data. As a fragment, the 60s refresh
+    reruns only this function; the page setup and sidebar rerun only when
+    a sidebar widget changes, or when the UTC day rolls past `page_day`
+    (the `today` the sidebar defaults were built for).
+    """
+    if datetime.utcnow().date() != page_day:
+        st.rerun(scope="app")
+
+    evict_on_new_rows()
+
+    # ============================================================
+    # Load Data
+    # ============================================================
+
+    exits_limit = st.session_state.setdefault("exits_limit", EXITS_PAGE_SIZE)
+
+    # The queries are independent, so issue them concurrently:
+    #   daily exits (metrics), shadow logs, the latest global exits (table),
+    #   and range trades (equity curve).
+    calls = [
+        (fetch_day_incremental, fetch_exits, selected_date),
+        (fetch_day_incremental, fetch_shadow, selected_date),
+        (fetch_latest_exits, exits_limit),
+    ]
+
+    # A 1D range is just the selected day, and the curve only reads exits,
+    # so it reuses the daily exits instead of fetching the day again.
+    range_is_day = range_start == selected_date and range_end == selected_date
+    if not range_is_day:
+        range_call = (fetch_trades_range, range_start, range_end, symbol)
+        # A range whose last day is settled no longer changes; serve it from disk
+        if is_settled(range_end):
+            range_call = (fetch_past, *range_call)
+        calls.append(range_call)
+
+    df_exits_day, df_shadow, df_exits, *df_range = run_concurrently(*calls)
+
+    # The range fetch is already narrowed to the symbol server-side
+    df_exits_day = filter_symbol(df_exits_day, symbol)
+    df_trades_range = df_range[0] if df_range else df_exits_day
+    df_shadow = filter_symbol(df_shadow, symbol)
+
+    # ============================================================
+    # Daily Summary
+    # ============================================================
+
+    st.subheader("📈 Daily Performance — Real Trades")
+
+    if df_exits_day.empty:
+        st.info("No exit trades for this date.")
     else:
-        # Base equity for the curve (can be set via env or secrets)
-        BASE_EQUITY = float(os.getenv("DASHBOARD_BASE_EQUITY", "100000"))
+        total_exits, total_pnl, wins, win_rate = reuse_if_unchanged(
+            "day_summary",
+            (selected_date, symbol, frame_fingerprint(df_exits_day)),
+            lambda: summarize_day(df_exits_day, symbol),
+        )
 
-        pnl_col_range = "realized_pnl" if "realized_pnl" in exits_range.columns else "pnl"
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Exit Trades (Day)", total_exits)
+        c2.metric("Total P&L (Day)", f"{total_pnl:,.2f}")
+        c3.metric("Wins (Day)", wins)
+        c4.metric("Win Rate (Day)", f"{win_rate:.1f}%")
 
-        curve = exits_range.sort_values("ts").copy()
-        curve[pnl_col_range] = curve[pnl_col_range].fillna(0)
-        curve["cum_pnl"] = curve[pnl_col_range].cumsum()
-        curve["equity"] = BASE_EQUITY + curve["cum_pnl"]
+    # ============================================================
+    # Portfolio Equity Curve over Range
+    # ============================================================
 
-        # Start-of-range anchor (horizontal line until first exit)
-        if range_start:
-            start_anchor = datetime.combine(range_start, dtime.min)
-        else:
-            first_ts = curve["ts"].min()
-            start_anchor = datetime.combine(first_ts.date(), dtime.min)
-
-        start_row = {
-            "ts": pd.to_datetime(start_anchor),
-            "cum_pnl": 0.0,
-            "equity": BASE_EQUITY,
-        }
-
-        curve = pd.concat(
-            [pd.DataFrame([start_row]), curve[["ts", "cum_pnl", "equity"]]],
-            ignore_index=True,
-        )
+    st.subheader("📊 Portfolio Value — Range View")
 
-        equity_chart = (
-            alt.Chart(curve)
-            .mark_line()
-            .encode(
-                x=alt.X("ts:T", title="Time"),
-                y=alt.Y(
-                    "equity:Q",
-                    title="Portfolio Value",
-                    scale=alt.Scale(zero=False),
-                ),
-                tooltip=[
-                    alt.Tooltip("ts:T", title="Time"),
-                    alt.Tooltip("equity:Q", title="Equity", format=",.2f"),
-                    alt.Tooltip("cum_pnl:Q", title="Realized P&L", format=",.2f"),
-                ],
-            )
-            .properties(height=300)
+    if df_trades_range.empty:
+        st.info("No trades in the selected range.")
+    else:
+        equity_chart = reuse_if_unchanged(
+            "equity_chart",
+            (range_start, range_end, symbol, frame_fingerprint(df_trades_range)),
+            lambda: build_equity_chart(df_trades_range, range_start),
         )
 
-        st.altair_chart(equity_chart, use_container_width=True)
-
+        if equity_chart is None:
+            st.info("No exit trades in the selected range.")
+        else:
+            st.altair_chart(equity_chart, use_container_width=True)
 
-# ============================================================
-# 💰 P&L by Symbol (same-day)
-# ============================================================
+    # ============================================================
+    # 💰 P&L by Symbol (same-day)
+    # ============================================================
 
-st.markdown("### 💰 P&L by Symbol (Day)")
+    st.markdown("### 💰 P&L by Symbol (Day)")
 
-if df_trades.empty:
-    st.info("No trades for this date.")
-else:
-    exits = df_trades[df_trades["is_exit_norm"] == True].copy()
-    if exits.empty:
+    if df_exits_day.empty:
         st.info("No exit trades for this date.")
     else:
-        pnl_col = "realized_pnl" if "realized_pnl" in exits.columns else "pnl"
-
-        pnl_by_sym = (
-            exits.groupby("symbol")[pnl_col]
-            .sum()
-            .reset_index()
-            .rename(columns={pnl_col: "total_pnl"})
-        )
-
-        chart = (
-            alt.Chart(pnl_by_sym)
-            .mark_bar(size=50)
-            .encode(
-                x=alt.X("symbol:N", title="Symbol"),
-                y=alt.Y("total_pnl:Q", title="Total P&L", scale=alt.Scale(zero=False)),
-                color=alt.condition(
-                    "datum.total_pnl > 0",
-                    alt.value("#00cc66"),
-                    alt.value("#cc0000"),
-                ),
-            )
-            .properties(height=300)
+        chart = reuse_if_unchanged(
+            "pnl_chart",
+            (selected_date, symbol, frame_fingerprint(df_exits_day)),
+            lambda: build_pnl_chart(df_exits_day, symbol),
         )
 
         st.altair_chart(chart, use_container_width=True)
 
+    # ============================================================
+    # Latest Exit Trades (Global, paginated)
+    # ============================================================
 
-# ============================================================
-# Latest 10 Exit Trades (Global)
-# ============================================================
-
-st.subheader("📜 Latest 10 Exit Trades (Global, P&L Colored)")
-
-df_all = fetch_trades(None, None)
-df_all["is_exit_norm"] = df_all["is_exit"].apply(normalize_exit_flag)
-
-# pick PnL column
-pnl_col_global = "realized_pnl" if "realized_pnl" in df_all.columns else "pnl"
+    st.subheader("📜 Latest Exit Trades (Global)")
 
-df_exits = df_all[(df_all["is_exit_norm"] == True) & df_all[pnl_col_global].notna()].copy()
-
-if df_exits.empty:
-    st.info("No exit trades available.")
-else:
-    df_exits = df_exits.sort_values("ts", ascending=False).head(10)
-
-    # ---- Color only the PnL cells ----
-    def highlight_pnl(val):
-        try:
-            v = float(val)
-            if v > 0:
-                return "background-color: rgba(0,255,0,0.25);"
-            if v < 0:
-                return "background-color: rgba(255,0,0,0.25);"
-        except Exception:
-            pass
-        return ""
-
-    # Color both pnl + realized_pnl columns when they exist
-    pnl_columns = [col for col in ["pnl", "realized_pnl"] if col in df_exits.columns]
-
-    styled = df_exits.style.applymap(
-        highlight_pnl,
-        subset=pnl_columns
-    )
+    # Rows without a realized P&L and the constant is_entry/is_exit flags are
+    # already excluded server-side, so the fetched frame is displayed as is.
+    if df_exits.empty:
+        st.info("No exit trades available.")
+    else:
+        # Force single-line, horizontal scroll
+        st.markdown(
+            """
+            <style>
+            .stDataFrame td {
+                white-space: nowrap !important;
+            }
+            </style>
+            """,
+            unsafe_allow_html=True
+        )
 
-    # Force single-line, horizontal scroll
-    st.markdown(
-        """
-        <style>
-        .stDataFrame td {
-            white-space: nowrap !important;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True
-    )
+        # The plain table is formatted client-side via column_config; the pandas
+        # Styler (server-side render of every styled cell) is opt-in.
+        if st.toggle("Color P&L cells", key="color_pnl"):
+            # Styler cost grows with the cells rendered, so only the newest
+            # STYLED_ROWS_MAX rows are styled.
+            styled = df_exits.head(STYLED_ROWS_MAX).style.apply(
+                pnl_styler,
+                subset=["pnl", "realized_pnl"],
+                axis=0,
+            )
+            st.dataframe(styled, height=350, hide_index=True)
 
-    st.dataframe(styled, height=350, hide_index=True)
+            if len(df_exits) > STYLED_ROWS_MAX:
+                with st.expander(f"Show all {len(df_exits)} rows (uncolored)"):
+                    st.dataframe(df_exits, height=350, hide_index=True)
+        else:
+            st.dataframe(
+                df_exits,
+                column_config={
+                    "pnl": st.column_config.NumberColumn(format="%.2f"),
+                    "realized_pnl": st.column_config.NumberColumn(format="%.2f"),
+                },
+                height=350,
+                hide_index=True,
+            )
 
+        st.caption(f"Showing latest {len(df_exits)} exit trades")
+        if len(df_exits) >= exits_limit:
+            st.button("Load more", on_click=load_more_exits)
 
-# ============================================================
-# Shadow Logs
-# ============================================================
+    # ============================================================
+    # Shadow Logs
+    # ============================================================
 
-st.subheader("🧪 ML Shadow-Mode Logs")
+    st.subheader("🧪 ML Shadow-Mode Logs")
 
-if df_shadow.empty:
-    st.info("No shadow logs.")
-else:
-    st.metric("Shadow log entries", len(df_shadow))
+    if df_shadow.empty:
+        st.info("No shadow logs.")
+    else:
+        st.metric("Shadow log entries", len(df_shadow))
 
-    if "ml_direction" in df_shadow.columns:
-        counts = df_shadow["ml_direction"].fillna("UNKNOWN").value_counts()
+        counts = reuse_if_unchanged(
+            "shadow_counts",
+            (selected_date, symbol, frame_fingerprint(df_shadow)),
+            lambda: direction_counts(df_shadow),
+        )
         st.bar_chart(counts)
 
-    cols = ["ts", "symbol", "ml_direction", "ml_win_prob", "bot_action"]
-    cols = [c for c in cols if c in df_shadow.columns]
+        # Fetched columns are exactly SHADOW_COLS, so no re-projection is needed.
+        # Rows arrive ts-ascending; reversing the view shows newest first without a sort.
+        st.dataframe(df_shadow.iloc[::-1], hide_index=True)
+
 
-    st.dataframe(df_shadow.sort_values("ts", ascending=False)[cols], hide_index=True)
+render_data_panels(today, selected_date, range_start, range_end, symbol)
 
 
 # ============================================================